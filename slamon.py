@@ -24,7 +24,7 @@ __version__ = "0.2.0"
 __license__ = "GPLv2+"
 
 import datetime
-import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from logzero import logger, loglevel
 
@@ -32,47 +32,49 @@ from slamon.thredds import ApplicationNode
 from slamon.modelrun import MEPSdet, MEPSdetpp, MEPSens, AAdet, AAdetpp
 from slamon.statuspage import StatusPage
 
+MODELS = (MEPSdet, MEPSdetpp, MEPSens, AAdet, AAdetpp)
+
 
 def fetch_nodes(nodes):
     """ Update node objects with model run lists from thredds
     """
-    threads = [threading.Thread(target=node.fetch) for node in nodes]
-    for thread in threads:
-        thread.start()
-    for thread in threads:
-        thread.join()
+    if not nodes:
+        return
+    with ThreadPoolExecutor(max_workers=len(nodes)) as executor:
+        list(executor.map(lambda node: node.fetch(), nodes))
 
-def _bulletin(dct, key):
+def _bulletin(arr, index):
     """ helper method to extract .bulletin or return None
     """
-    obj = dct.get(key, None)
+    obj = arr[index]
     if obj:
         return obj.bulletin
     return None
 
 def extract_most_recent_bulletin(models, nodes):
-    """ Get the most recent bulletin that all nodes can agree on for each model
+    """ Get the most recent bulletin that all nodes can agree on for each
+        model, as a list aligned with the models tuple
     """
     logger.debug('Deciding on most recent bulletin that all nodes can agree on for each model')
-    most_recent_bulletin = {}
-    for model in models:
+    most_recent_bulletin = [None] * len(models)
+    for index, model in enumerate(models):
         for node in nodes:
-            kept_bulletin = _bulletin(most_recent_bulletin, model)
-            candidate_bulletin = _bulletin(node.result, model)
+            kept_bulletin = _bulletin(most_recent_bulletin, index)
+            candidate_bulletin = _bulletin(node.result, index)
             if candidate_bulletin:
                 # as we have collected the most recent bulletin for each model from each node
                 # what is left is to keep the least recent bulletin for each model
                 # this is worst case of what a visitor sees (the most recent model run published on all nodes)
                 if kept_bulletin is None or candidate_bulletin < kept_bulletin:
-                    most_recent_bulletin[model] = node.result[model]  # store obj, not just datetime
-        logger.debug('Most recent bulletin for %s is %s', model.NAME, _bulletin(most_recent_bulletin, model))
+                    most_recent_bulletin[index] = node.result[index]  # store obj, not just datetime
+        logger.debug('Most recent bulletin for %s is %s', model.NAME, _bulletin(most_recent_bulletin, index))
     return most_recent_bulletin
 
 def resolve(statuspage, model, component_status, open_incident):
     """ Ensure that statuspage has healty component status and that any open
         incident is resolved.
     """
-    if not statuspage.status(model.STATUSPAGE_ID) == component_status:
+    if not statuspage.get_status(model.STATUSPAGE_ID) == component_status:
         statuspage.status(model.STATUSPAGE_ID, component_status)
     if open_incident:
         statuspage.resolve_incident(open_incident.id)
@@ -81,45 +83,46 @@ def main(args):
     """ Main entry point
     """
     now = datetime.datetime.now(tz=datetime.timezone.utc)
-    models = (MEPSdet, MEPSdetpp, MEPSens, AAdet, AAdetpp)
 
     nodes = []
     for node in args.config.get('nodes', []):
-        nodes.append(ApplicationNode(models=models, **node))
+        nodes.append(ApplicationNode(models=MODELS, **node))
 
     fetch_nodes(nodes)
-    most_recent_bulletin = extract_most_recent_bulletin(models, nodes)
+    most_recent_bulletin = extract_most_recent_bulletin(MODELS, nodes)
 
     statuspage = StatusPage(dryrun=args.dryrun, **args.config.get('statuspage', []))
-    for model in most_recent_bulletin:
+    for index, model in enumerate(MODELS):
+        if most_recent_bulletin[index] is None:
+            continue
         title = '{} production'.format(model.NAME)
         required_model = model.required(now)
 
-        open_incident = False
-        for incident in statuspage.get_incidents_for_component(model.STATUSPAGE_ID):
-            if incident.title == title:
-                open_incident = incident
-                logger.debug("Found open indicent %s for %s", incident.id, model.NAME)
-                break
+        open_incidents = {incident.title: incident for incident in statuspage.get_incidents_for_component(model.STATUSPAGE_ID)}
+        open_incident = open_incidents.get(title, False)
+        if open_incident:
+            logger.debug("Found open indicent %s for %s", open_incident.id, model.NAME)
 
         component_status = 'operational'
-        if most_recent_bulletin[model].bulletin >= required_model.bulletin:
+        if most_recent_bulletin[index].bulletin >= required_model.bulletin:
             resolve(statuspage, model, component_status, open_incident)
         else:
             impact = 'none'
             message = "{} results from model run based on analysis of {} is not yet published. Normally we would expect it by now. Please use earlier forecast.".format(model.NAME, required_model.bulletin.strftime('%Y-%m-%d %H %Z'))
-            if required_model.is_delayed(now) or required_model.prev().bulletin > most_recent_bulletin[model].bulletin:
+            if required_model.is_delayed(now) or required_model.prev().bulletin > most_recent_bulletin[index].bulletin:
                 component_status = 'degraded_performance'
                 impact = 'minor'
                 message = "{} results from model run based on analysis of {} is not yet published. This is a significant delay and we are sorry about any inconvenience. Please use earlier forecast.".format(model.NAME, required_model.bulletin.strftime('%Y-%m-%d %H %Z'))
             message = message.replace('UTC+00:00', 'UTC')
 
+            # Only write when the remote state actually differs - every
+            # avoided call saves a rate-limit slot plus a round-trip
+            if not statuspage.get_status(model.STATUSPAGE_ID) == component_status:
+                statuspage.status(model.STATUSPAGE_ID, component_status)
             if open_incident:
-                if not statuspage.status(model.STATUSPAGE_ID) == component_status:
-                    statuspage.status(model.STATUSPAGE_ID, component_status)
-                    statuspage.update_incident(open_incident.id, message, impact=impact)
+                if message != open_incident.latest_body or impact != open_incident.impact:
+                    statuspage.update_incident(open_incident.id, message=message, impact=impact)
             else:
-                statuspage.status(model.STATUSPAGE_ID, component_status)
                 statuspage.create_incident(model.STATUSPAGE_ID, title, message, impact=impact)
 
 if __name__ == "__main__":
@@ -139,6 +142,12 @@ if __name__ == "__main__":
     else:
         loglevel(logging.DEBUG)
 
-    ARGS.config = json.load(open(ARGS.config_file))
+    with open(ARGS.config_file, 'rb') as CONFIG_FILE:
+        CONFIG_DATA = CONFIG_FILE.read()
+    try:
+        import orjson
+        ARGS.config = orjson.loads(CONFIG_DATA)
+    except ImportError:
+        ARGS.config = json.loads(CONFIG_DATA)
 
     main(ARGS)
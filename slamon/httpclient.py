@@ -0,0 +1,109 @@
+""" HTTP client factory shared by the thredds and statuspage modules.
+
+    Prefers httpx with HTTP/2 when installed, so concurrent requests to the
+    same host multiplex over one TLS connection; falls back to a pooled
+    requests.Session otherwise. Both flavors retry transient failures:
+    requests via urllib3's Retry, httpx via transport-level connection
+    retries plus the status-code retry loop below.
+"""
+# pylint: disable=C0301
+
+__author__ = "Christian Skarby"
+__version__ = "0.2.0"
+__license__ = "GPLv2+"
+
+
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import httpx
+    import h2  # noqa: F401 - http2=True needs the httpx[http2] extra
+except ImportError:  # httpx is optional - fall back to requests
+    httpx = None
+
+_RETRY_STATUSES = (429, 502, 503, 504)
+_RETRY_TOTAL = 3
+_BACKOFF_FACTOR = 0.5
+
+
+def make_client(headers=None, timeout=10.0):
+    """ Return a pooled HTTP client with the given default headers.
+
+        Both flavors support .get(url, headers=..., timeout=...); use
+        request() below for calls with a raw body.
+    """
+    if httpx is not None:
+        transport = httpx.HTTPTransport(
+            http2=True,
+            retries=2,  # connection-level retries; status codes are handled in _httpx_request
+            limits=httpx.Limits(max_keepalive_connections=8, max_connections=16),
+        )
+        return httpx.Client(
+            transport=transport,
+            timeout=timeout,
+            headers=headers or {},
+        )
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=8,
+        max_retries=Retry(
+            total=_RETRY_TOTAL,
+            backoff_factor=_BACKOFF_FACTOR,
+            status_forcelist=_RETRY_STATUSES,
+            allowed_methods=frozenset(['GET', 'POST', 'PATCH']),
+            respect_retry_after_header=True,
+        ),
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update(headers or {})
+    return session
+
+
+def _retry_wait(response, attempt):
+    """ Seconds to wait before retrying response, honoring Retry-After
+    """
+    retry_after = response.headers.get('Retry-After')
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass  # HTTP-date form - fall back to exponential backoff
+    return _BACKOFF_FACTOR * (2 ** attempt)
+
+
+def _httpx_request(client, method, url, headers=None, body=None, timeout=10):
+    """ Issue a request on an httpx client, retrying transient 429/5xx
+        responses with backoff for parity with the urllib3 Retry used on
+        the requests fallback
+    """
+    for attempt in range(_RETRY_TOTAL):
+        response = client.request(method, url, headers=headers, content=body, timeout=timeout)
+        if response.status_code not in _RETRY_STATUSES:
+            return response
+        time.sleep(_retry_wait(response, attempt))
+    return client.request(method, url, headers=headers, content=body, timeout=timeout)
+
+
+def get(client, url, headers=None, timeout=10, stream=False):
+    """ GET on a client from make_client. stream is only honored by the
+        requests fallback; httpx reads the body up front and relies on
+        HTTP/2 multiplexing instead
+    """
+    if httpx is not None and isinstance(client, httpx.Client):
+        return _httpx_request(client, 'GET', url, headers=headers, timeout=timeout)
+    return client.get(url, headers=headers, timeout=timeout, stream=stream)
+
+
+def request(client, method, url, body='', timeout=10):
+    """ Issue a request with a raw body on a client from make_client,
+        papering over the different body keyword between httpx and requests
+    """
+    if httpx is not None and isinstance(client, httpx.Client):
+        return _httpx_request(client, method.upper(), url, body=body, timeout=timeout)
+    return client.request(method.upper(), url, data=body, timeout=timeout)
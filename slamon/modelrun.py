@@ -10,6 +10,26 @@ __license__ = "GPLv2+"
 
 
 import datetime
+import functools
+import re
+
+
+@functools.lru_cache(maxsize=64)
+def _required_bulletin(cls, datetime_, utcoffset):
+    """ Memoized bulletin computation behind ModelRun.required. utcoffset is
+        part of the key because aware datetimes denoting the same instant in
+        different zones hash alike, while the result depends on the original
+        zone's date fields. Only the datetime is cached; required() hands
+        each caller a fresh instance.
+    """
+    assert utcoffset == datetime_.utcoffset()
+    utctime = datetime_.astimezone(datetime.timezone.utc) - cls.REQUIRED_OFFSET # ModelRun is not required immedeately after init...
+    for prev_hour in cls._INIT_HOURS_DESC:
+        prev = datetime.datetime(datetime_.year, datetime_.month, datetime_.day, hour=prev_hour, tzinfo=datetime.timezone.utc)
+        if utctime >= prev:
+            return prev
+    yesterday = utctime - datetime.timedelta(days=1)
+    return datetime.datetime(yesterday.year, yesterday.month, yesterday.day, hour=cls._INIT_HOURS_DESC[0], tzinfo=datetime.timezone.utc)
 
 
 class ModelRun:
@@ -28,6 +48,42 @@ class ModelRun:
     def __init__(self):
         self.bulletin = False
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._compile_pattern()
+        cls._INIT_HOURS_DESC = tuple(sorted(cls.INIT_HOURS, reverse=True))
+        # Fold the constant timedelta sums so the hot paths skip the arithmetic
+        cls.REQUIRED_OFFSET = cls.EXPECTED + cls.WARNING_AFTER
+        cls.DELAY_THRESHOLD = cls.EXPECTED + cls.ERROR_AFTER
+
+    @classmethod
+    def _compile_pattern(cls):
+        """ Derive FILENAME_PREFIX and a compiled regex from PATTERN once per
+            class, so dataset names can be matched without strptime
+        """
+        prefix, _, suffix = cls.PATTERN.partition('%Y%m%dT%HZ')
+        cls.FILENAME_PREFIX = prefix
+        cls.FILENAME_SUFFIX = suffix
+        cls._REGEX = re.compile(re.escape(prefix) + r'(\d{4})(\d{2})(\d{2})T(\d{2})Z' + re.escape(suffix) + r'$')
+
+    @classmethod
+    def match_bulletin(cls, name):
+        """ Parse a dataset name into a bulletin datetime, or return None if
+            the name does not match PATTERN.
+
+        >>> ModelRun.match_bulletin('filename_19700101T00Z.nc')
+        datetime.datetime(1970, 1, 1, 0, 0, tzinfo=datetime.timezone.utc)
+        >>> ModelRun.match_bulletin('otherfile_19700101T00Z.nc') is None
+        True
+        """
+        if not name.startswith(cls.FILENAME_PREFIX):
+            return None
+        match = cls._REGEX.match(name)
+        if not match:
+            return None
+        year, month, day, hour = (int(group) for group in match.groups())
+        return datetime.datetime(year, month, day, hour, tzinfo=datetime.timezone.utc)
+
     @classmethod
     def required(cls, datetime_):
         """ Returns a ModelRun instance with bulletin date set to the most
@@ -44,18 +100,8 @@ class ModelRun:
         datetime.datetime(1970, 1, 1, 18, 0, tzinfo=datetime.timezone.utc)
         """
         assert datetime_.tzinfo is not None
-        utctime = datetime_.astimezone(datetime.timezone.utc) - cls.EXPECTED - cls.WARNING_AFTER # ModelRun is not required immedeately after init...
-        init_hours = list(cls.INIT_HOURS)
-        init_hours.sort(reverse=True)  # The following depends on reverse sorted init_hours, i.e. last first
         obj = cls()
-        for prev_hour in init_hours:
-            prev = datetime.datetime(datetime_.year, datetime_.month, datetime_.day, hour=prev_hour, tzinfo=datetime.timezone.utc)
-            if utctime >= prev:
-                obj.bulletin = prev
-                break
-        if not obj.bulletin:
-            yesterday = utctime - datetime.timedelta(days=1)
-            obj.bulletin = datetime.datetime(yesterday.year, yesterday.month, yesterday.day, hour=init_hours[0], tzinfo=datetime.timezone.utc)
+        obj.bulletin = _required_bulletin(cls, datetime_, datetime_.utcoffset())
         return obj
 
     def prev(self):
@@ -83,7 +129,14 @@ class ModelRun:
         """
         assert self.bulletin is not False
         assert datetime_.tzinfo is not None
-        return self.bulletin + self.EXPECTED + self.ERROR_AFTER <= datetime_
+        return self.bulletin + self.DELAY_THRESHOLD <= datetime_
+
+
+# __init_subclass__ only covers subclasses
+ModelRun._compile_pattern()
+ModelRun._INIT_HOURS_DESC = tuple(sorted(ModelRun.INIT_HOURS, reverse=True))
+ModelRun.REQUIRED_OFFSET = ModelRun.EXPECTED + ModelRun.WARNING_AFTER
+ModelRun.DELAY_THRESHOLD = ModelRun.EXPECTED + ModelRun.ERROR_AFTER
 
 
 class MEPS(ModelRun):
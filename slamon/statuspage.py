@@ -10,40 +10,75 @@ __license__ = "GPLv2+"
 import json
 import time
 import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
-import requests
 from logzero import logger
 
+from slamon import httpclient
+
+try:
+    import orjson
+except ImportError:  # orjson is optional - fall back to the stdlib encoder
+    orjson = None
+
+
+def _dumps(obj):
+    """ Serialize a request body to JSON bytes, with orjson when available
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode()
+
 class Incident:
     # pylint: disable=R0903
     def __init__(self, incident_id, title):
         self.id = incident_id  # pylint: disable=C0103
         self.title = title
-        self.affected_components = []
+        self.affected_components = set()
+        self.impact = None
+        self.latest_body = None
 
 class StatusPage:
-    API_LOCK = threading.Semaphore()
+    # statuspage.io has a limit of one request per second - reserve one-second
+    # slots instead of unconditionally sleeping before every request
+    _RATE_LOCK = threading.Lock()
+    _next_allowed_ts = 0.0
 
     def __init__(self, page_id='4b9b31tffb5x', apikey=None, dryrun=False):
         self.__headers = {}
         if apikey:
             self.__headers['Authorization'] = 'OAuth {}'.format(apikey)
+        # One keep-alive client shared by all API calls - statuspage.io is
+        # hit several times per run and TLS setup dominates each call
+        self.session = httpclient.make_client(self.__headers)
         self.__page_id = page_id
         self.__components = {}
-        self.__update_local_component_status()
         self.__active_incidents = {}
-        self.__update_local_incident_status()
+        self.__incidents_by_component = {}
         self.__dryrun = dryrun
+        # The two bootstrap calls hit independent endpoints - launch them
+        # concurrently so their network waits overlap the rate-limit slots
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            components = executor.submit(self.__update_local_component_status)
+            incidents = executor.submit(self.__update_local_incident_status)
+            components.result()
+            incidents.result()
 
     def __call(self, url, method='get', body='', timeout=10):
-        with self.API_LOCK:
-            time.sleep(1)  # statuspage.io has a limit of one request per second - enforce compliant behavior by waiting 1 second before each request
-            response = getattr(requests, method)(url, data=body, headers=self.__headers, timeout=timeout)
-            response.raise_for_status()
-            result = response.json()
-            if 'error' in result:
-                raise RuntimeError("Failed to call {}, received {}".format(url, response.text))
-            return result
+        # Claim the next one-second slot, then release the lock so other
+        # callers can queue up while we sleep and wait on the network
+        with StatusPage._RATE_LOCK:
+            wait = StatusPage._next_allowed_ts - time.monotonic()
+            StatusPage._next_allowed_ts = max(time.monotonic(), StatusPage._next_allowed_ts) + 1.0
+        if wait > 0:
+            time.sleep(wait)
+        response = httpclient.request(self.session, method, url, body=body, timeout=timeout)
+        response.raise_for_status()
+        result = response.json()
+        if 'error' in result:
+            raise RuntimeError("Failed to call {}, received {}".format(url, response.text))
+        return result
 
     def __update_local_component_status(self):
         data = self.__call('https://{}.statuspage.io/api/v2/components.json'.format(self.__page_id))
@@ -65,28 +100,38 @@ class StatusPage:
                 for item in subdata:
                     yield item
 
+        incidents_by_component = defaultdict(list)
         for incident in iterate(data, "incidents"):
             obj = Incident(incident['id'], incident['name'])
+            obj.impact = incident.get('impact', None)
             for update in iterate(incident, "incident_updates"):
+                if obj.latest_body is None:  # updates are listed most recent first
+                    obj.latest_body = update.get('body', None)
                 for component in iterate(update, "affected_components"):
-                    if not component['code'] in obj.affected_components:
-                        obj.affected_components.append(component['code'])
+                    obj.affected_components.add(component['code'])
+            for code in obj.affected_components:
+                incidents_by_component[code].append(obj)
             active_incidents[obj.id] = obj
 
         self.__active_incidents = active_incidents
+        self.__incidents_by_component = incidents_by_component
 
     def get_incidents_for_component(self, component_id):
-        for _, incident in self.__active_incidents.items():
-            if component_id in incident.affected_components:
-                yield incident
+        return iter(self.__incidents_by_component.get(component_id, ()))
 
     def status(self, component_id, new_status=None):
         if new_status:
             self.__set_status(component_id, new_status)
-            self.__update_local_component_status()
-        return self.__get_status(component_id)
-
-    def __get_status(self, component_id):
+            # The API accepted the new value - record it locally instead of
+            # refetching the whole component list
+            component = self.__components.get(component_id, None)
+            if component:
+                component['status'] = new_status
+        return self.get_status(component_id)
+
+    def get_status(self, component_id):
+        """ Component status from the local cache - never re-fetches
+        """
         component = self.__components.get(component_id, None)
         if component:
             return component.get('status', None)
@@ -94,17 +139,19 @@ class StatusPage:
 
     def __set_status(self, component_id, new_status):
         assert new_status in ('operational', 'degraded_performance', 'partial_outage', 'major_outage')
+        if self.__components.get(component_id, {}).get('status') == new_status:
+            return  # already there - skip the PATCH and its rate-limit slot
         if self.__dryrun:
             logger.info("DRYRUN: Would set component %s to %s", component_id, new_status)
             return
-        try:
-            self.__call(
-                'https://api.statuspage.io/v1/pages/{}/components/{}.json'.format(self.__page_id, component_id),
-                method='patch',
-                body=json.dumps({'component': {'status': new_status}}),
-            )
-        except:
-            pass
+        # Transient 429/5xx responses are retried by the HTTP layer; anything
+        # that still fails should propagate rather than silently leave the
+        # local cache out of sync with the remote
+        self.__call(
+            'https://api.statuspage.io/v1/pages/{}/components/{}.json'.format(self.__page_id, component_id),
+            method='patch',
+            body=_dumps({'component': {'status': new_status}}),
+        )
 
     def create_incident(self, component_id, title, message, impact=None):
         """ Open remote incident
@@ -118,13 +165,13 @@ class StatusPage:
         if impact:
             assert impact in ('none', 'minor', 'major')
             payload['impact_override'] = impact
-        body = json.dumps({"incident": payload})
+        body = _dumps({"incident": payload})
 
         if self.__dryrun:
-            logger.info("Would create incident: %s", body)
+            logger.info("Would create incident: %s", body.decode())
             logger.info("Dryrun - not creating incident on statuspage.io...")
             return
-        logger.debug("Creating incident: %s", body)
+        logger.debug("Creating incident: %s", body.decode())
 
         self.__call(
             'https://api.statuspage.io/v1/pages/{}/incidents.json'.format(self.__page_id),
@@ -157,7 +204,7 @@ class StatusPage:
         self.__call(
             'https://api.statuspage.io/v1/pages/{}/incidents/{}.json'.format(self.__page_id, incident_id),
             method='patch',
-            body=json.dumps({'incident': payload}),
+            body=_dumps({'incident': payload}),
         )
 
     def resolve_incident(self, incident_id):
@@ -5,12 +5,105 @@ __author__ = "Christian Skarby"
 __version__ = "0.2.0"
 __license__ = "GPLv2+"
 
+import base64
 import datetime
+import io
+import json
+import os
+import re
+import threading
 import xml.etree.ElementTree
+from concurrent.futures import ThreadPoolExecutor
 
-import requests
 from logzero import logger
 
+from slamon import httpclient
+from slamon.httpclient import make_client
+
+try:
+    from lxml import etree
+except ImportError:  # lxml is optional - fall back to the stdlib parser
+    etree = None
+
+# Catalog fetches are pure I/O-wait; share one pool across all nodes so
+# requests to different URLs overlap instead of serializing on RTT
+_EXECUTOR = ThreadPoolExecutor(max_workers=8)
+
+_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.cache', 'slamon', 'catalog.json')
+_CACHE_LOCK = threading.Lock()  # nodes fetch concurrently but share one cache file
+
+
+def _read_catalog_cache():
+    """ Read the persisted cache file - callers must hold _CACHE_LOCK
+    """
+    try:
+        with open(_CACHE_FILE) as filehandle:
+            return json.load(filehandle)
+    except (OSError, ValueError):
+        return {}
+
+
+def _load_catalog_cache():
+    """ Load the conditional-GET catalog cache persisted by earlier runs
+    """
+    with _CACHE_LOCK:
+        return _read_catalog_cache()
+
+
+def _save_catalog_cache(cache):
+    """ Persist the conditional-GET catalog cache for the next invocation,
+        merging with entries other nodes saved meanwhile and replacing the
+        file atomically so readers never see a torn write
+    """
+    with _CACHE_LOCK:
+        merged = _read_catalog_cache()
+        merged.update(cache)
+        try:
+            os.makedirs(os.path.dirname(_CACHE_FILE), exist_ok=True)
+            tmp_file = _CACHE_FILE + '.tmp'
+            with open(tmp_file, 'w') as filehandle:
+                json.dump(merged, filehandle)
+            os.replace(tmp_file, _CACHE_FILE)
+        except OSError as err:
+            logger.warning("Could not persist catalog cache to %s: %s", _CACHE_FILE, err)
+
+
+def _iter_dataset_names(source, tag):
+    """ Yield the name attribute of every dataset element in a catalog read
+        from the file-like source, parsing incrementally so bytes are
+        consumed as they arrive and memory stays bounded to a single
+        dataset element
+    """
+    if etree is not None:
+        for _, elem in etree.iterparse(source, events=('end',), tag=tag):
+            yield elem.get('name', '')
+            elem.clear()  # free the parsed subtree
+    else:
+        for _, elem in xml.etree.ElementTree.iterparse(source, events=('end',)):
+            if elem.tag == tag:
+                yield elem.get('name', '')
+            elem.clear()
+
+
+class _TeeReader(io.RawIOBase):
+    """ File-like that copies everything read from source into buffer, so a
+        streamed response body can be parsed and cached in one pass
+    """
+
+    def __init__(self, source, buffer):
+        super().__init__()
+        self._source = source
+        self._buffer = buffer
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        chunk = self._source.read(size)
+        if chunk:
+            self._buffer.write(chunk)
+        return chunk
+
 
 class ApplicationNode:
     """ Fetch from single node and get the node's result for all monitored models
@@ -19,48 +112,114 @@ class ApplicationNode:
     XMLNS = {'InvCatalog': 'http://www.unidata.ucar.edu/namespaces/thredds/InvCatalog/v1.0'}
 
     def __init__(self, apikey=None, models=(), name='node'):
-        self.result = {}
-        for model in models:
-            self.result[model] = model()
-        self.urls = []
+        # result is a list aligned with the models tuple, indexed by model
+        # position - no class-object hashing in the hot loops
+        self.result = [model() for model in models]
+        self._models_list = tuple(self.result)
+        self._combined_regex = self._build_combined_regex(self._models_list)
+        self._fetched_urls = set()
         self.name = name
         self.headers = {}
         if apikey:
             self.headers['Authorization'] = 'Bearer {}'.format(apikey)
-
-    def models(self):
-        """ Generator providing module objects
-        """
-        for cls in self.result:
-            yield self.result[cls]
+        # Reuse one keep-alive connection pool for all catalog requests instead
+        # of paying a fresh TCP+TLS handshake per URL
+        self.session = make_client(self.headers)
 
     def fetch(self):
-        """ Fetch URL and send response.content to callback
+        """ Fetch all unique model URLs concurrently and send each
+            catalog to callback, revalidating cached catalogs with
+            conditional GETs
         """
-        for model in self.models():
-            if not model.URL in self.urls:
-                self.urls.append(model.URL)
-                response = requests.get(model.URL, headers=self.headers, timeout=10)
+        urls = []
+        for model in self._models_list:
+            if model.URL not in self._fetched_urls:
+                self._fetched_urls.add(model.URL)
+                urls.append(model.URL)
+        cache = _load_catalog_cache()
+        responses = _EXECUTOR.map(lambda url: self.__conditional_get(url, cache.get(url)), urls)
+        for url, response in zip(urls, responses):
+            if response.status_code == 304 and url in cache:
+                # Unchanged on the server - reuse the cached body instead of re-downloading
+                self.__callback(io.BytesIO(base64.b64decode(cache[url]['content'])))
+                logger.debug("Catalog %s unchanged on %s (HTTP 304)", url, self.name)
+            else:
                 response.raise_for_status()
-                self.__callback(response.content)
-                logger.debug("Fetched %s from %s", model.URL, self.name)
+                # Parse while the body streams in, teeing the bytes into a
+                # buffer so the cache still gets the full document
+                buffer = io.BytesIO()
+                tee = _TeeReader(self.__body_stream(response), buffer)
+                self.__callback(tee)
+                while tee.read(65536):  # drain any bytes after the document end
+                    pass
+                cache[url] = {
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'content': base64.b64encode(buffer.getvalue()).decode('ascii'),
+                }
+                logger.debug("Fetched %s from %s", url, self.name)
+        _save_catalog_cache(cache)
+        for model in self._models_list:
             logger.debug(
                 "Most recent bulletin for %s on %s is %s.",
                 model.NAME, self.name, model.bulletin
             )
 
-    def __callback(self, value):
-        """ Store most recent bulletin for each model
+    def __conditional_get(self, url, cached):
+        """ GET url, sending validators from the cached entry if present
         """
-        xmltree = xml.etree.ElementTree.fromstring(value)
-        for dataset in xmltree.findall(".//InvCatalog:dataset/*[@name]", self.XMLNS):
-            for model in self.models():
-                try:
-                    bulletin = datetime.datetime.strptime(dataset.get('name', ''), model.PATTERN)
-                except ValueError:
-                    pass
-                else:
-                    bulletin = bulletin.replace(tzinfo=datetime.timezone.utc)
-                    # Set model bulletin to most recent for that model available through this node
-                    if not model.bulletin or bulletin > model.bulletin:
-                        model.bulletin = bulletin
+        headers = {}
+        if cached:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+        return httpclient.get(self.session, url, headers=headers, timeout=10, stream=True)
+
+    @staticmethod
+    def __body_stream(response):
+        """ File-like view of the response body - the undecoded stream when
+            the HTTP library kept it open, the buffered body otherwise
+        """
+        raw = getattr(response, 'raw', None)
+        if raw is not None:  # requests with stream=True
+            raw.decode_content = True  # transparent gzip
+            return raw
+        return io.BytesIO(response.content)  # httpx read the body up front
+
+    @staticmethod
+    def _build_combined_regex(models):
+        """ Build one alternation regex matching any model's dataset names in
+            a single pass. Each alternative holds exactly five capturing
+            groups (prefix, year, month, day, hour), so the group numbers
+            encode which model matched.
+        """
+        if not models:
+            return None
+        alternatives = [
+            r'({})(\d{{4}})(\d{{2}})(\d{{2}})T(\d{{2}})Z{}$'.format(
+                re.escape(model.FILENAME_PREFIX), re.escape(model.FILENAME_SUFFIX)
+            )
+            for model in models
+        ]
+        return re.compile('|'.join(alternatives))
+
+    def __callback(self, source):
+        """ Store most recent bulletin for each model, reading the catalog
+            from the file-like source
+        """
+        if self._combined_regex is None:
+            return
+        for name in _iter_dataset_names(source, '{{{}}}dataset'.format(self.XMLNS['InvCatalog'])):
+            match = self._combined_regex.match(name)
+            if not match:
+                continue
+            # lastindex is the hour group of the alternative that matched;
+            # five groups per alternative map it back to the model index
+            hour_group = match.lastindex
+            model = self._models_list[(hour_group - 1) // 5]
+            year, month, day, hour = (int(group) for group in match.group(hour_group - 3, hour_group - 2, hour_group - 1, hour_group))
+            bulletin = datetime.datetime(year, month, day, hour, tzinfo=datetime.timezone.utc)
+            # Set model bulletin to most recent for that model available through this node
+            if not model.bulletin or bulletin > model.bulletin:
+                model.bulletin = bulletin